@@ -1,5 +1,6 @@
 """Shared utilities for geospeed benchmarks."""
 
+import os
 from pathlib import Path
 
 
@@ -18,11 +19,27 @@ def get_data_dir() -> Path:
     raise FileNotFoundError(no_alkis_data_msg)
 
 
+def find_shapefiles(data_dir: Path) -> tuple[list[Path], list[Path]]:
+    """Find building and parcel shapefiles in the county folders of data_dir in a single pass."""
+    buildings_paths: list[Path] = []
+    parcels_paths: list[Path] = []
+    with os.scandir(data_dir) as counties:
+        for county in counties:
+            if not county.is_dir():
+                continue
+            with os.scandir(county.path) as files:
+                for f in files:
+                    if f.name == "GebauedeBauwerk.shp":
+                        buildings_paths.append(Path(f.path))
+                    elif f.name == "NutzungFlurstueck.shp":
+                        parcels_paths.append(Path(f.path))
+    return buildings_paths, parcels_paths
+
+
 def get_file_paths() -> tuple[list[Path], list[Path]]:
     """Get building and parcel file paths from data directory."""
     data_dir = get_data_dir()
-    buildings_paths = list(data_dir.glob("*/GebauedeBauwerk.shp"))
-    parcels_paths = list(data_dir.glob("*/NutzungFlurstueck.shp"))
+    buildings_paths, parcels_paths = find_shapefiles(data_dir)
 
     if not buildings_paths or not parcels_paths:
         no_shapefiles_msg = "No shapefiles found in the data directory."
@@ -3,22 +3,27 @@
 Run the repository's benchmark scripts and collect timing results.
 
 - Detects presence of input data in ./ALKIS (or via DATA_DIR env).
-- Runs each benchmark script as a subprocess using the current interpreter.
+- Runs each benchmark script as a subprocess using the current interpreter, one at a
+  time by default. With --parallel, the light scripts run next to the heavy ones.
 - Records wall-clock durations and exit codes in benchmarks/latest.json.
 - Skips gracefully if the data directory is missing.
 
 Usage:
-    uv run python scripts/benchmarks.py
+    uv run python scripts/benchmarks.py [--parallel]
 """
 
 from __future__ import annotations
 
+import argparse
+import collections
 import contextlib
 import json
+import os
 import subprocess
 import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import TYPE_CHECKING
 
@@ -52,74 +57,164 @@ SCRIPTS: list[tuple[str, Path]] = [
     ("sedona_pyspark", REPO_ROOT / "geospeed" / "sedona_pyspark_ci.py"),  # CI version without Docker
 ]
 
+# Scripts that load the full dataset in memory or use all cores. Two of them at once would
+# compete for RAM and CPU and skew each other's timings, so in parallel mode they run one
+# after the other in one lane. Only the county-wise geopandas script, which holds a single
+# county in memory, runs next to them in a second lane. So --parallel only saves that
+# script's runtime and is meant for quick local runs, not for the published timings.
+HEAVY_SCRIPTS = {"geopandas", "dask_geopandas", "duckdb", "geofileops", "sedona_pyspark"}
+
+# Number of output lines of a failed script to keep in the results
+LOG_TAIL_LINES = 20
+
+# Exit code, duration, output tail, peak memory and peak memory less available of a script run
+type RunResult = tuple[int, float, str, float | None, float | None]
+
 
 def has_data(data_dir: Path) -> bool:
     """Check if the data directory contains expected shapefiles."""
     if not data_dir.exists():
         return False
-    # Look for at least one expected shapefile
-    return any(sub.is_file() for sub in data_dir.glob("*/GebauedeBauwerk.shp"))
+    # Look for at least one expected shapefile, stopping at the first hit
+    with os.scandir(data_dir) as entries:
+        for entry in entries:
+            if entry.is_dir() and (Path(entry.path) / "GebauedeBauwerk.shp").is_file():
+                return True
+    return False
+
 
+def write_results(results: dict[str, dict[str, object]]) -> None:
+    """Write the results file atomically, so an interrupted run doesn't leave a truncated file."""
+    tmp_file = RESULTS_FILE.with_suffix(".json.tmp")
+    tmp_file.write_text(json.dumps(results, indent=2))
+    tmp_file.replace(RESULTS_FILE)
 
-def run_script(path: Path) -> tuple[int, float, str, float | None]:
+
+def sample_memory(pid: int, stop: threading.Event, stats: dict[str, float | None]) -> None:
+    """
+    Sample memory usage until stop is set.
+
+    Tracks the peak RSS of process pid and its children in stats["peak_mem_mb"] and
+    the minimum available system memory in stats["min_mem_free_mb"].
+    """
+    if psutil is None:
+        return
+    try:
+        target = psutil.Process(pid)
+        # Walking the process tree is relatively expensive, so only refresh the
+        # list of children every 10 samples
+        child_cache: list[psutil.Process] = []
+        iteration = 0
+        while not stop.is_set():
+            mem_free_mb = psutil.virtual_memory().available / (1024 * 1024)
+            min_mem_free_mb = stats["min_mem_free_mb"]
+            stats["min_mem_free_mb"] = mem_free_mb if min_mem_free_mb is None else min(min_mem_free_mb, mem_free_mb)
+            if iteration % 10 == 0:
+                with contextlib.suppress(psutil.Error):
+                    child_cache = target.children(recursive=True)
+            iteration += 1
+            rss = 0
+            for p in [target, *child_cache]:
+                with contextlib.suppress(psutil.Error):
+                    rss += p.memory_info().rss
+            cur_mb = rss / (1024 * 1024)
+            peak_mem_mb = stats["peak_mem_mb"]
+            stats["peak_mem_mb"] = cur_mb if peak_mem_mb is None or cur_mb > peak_mem_mb else peak_mem_mb
+            stop.wait(0.1)
+    except psutil.Error:
+        pass
+
+
+def run_script(path: Path) -> RunResult:
     """Run a benchmark script and collect timing and memory information."""
     start = time.perf_counter()
-    peak_mem_mb: float | None = None
-    min_mem_free_mb: float | None = None
-
-    # If psutil available, sample RSS of current process recursively
-    stop_flag = False
-
-    def sampler() -> None:
-        nonlocal peak_mem_mb
-        nonlocal min_mem_free_mb
-        if psutil is None:
-            return
-        try:
-            this_proc = psutil.Process()
-            while not stop_flag:
-                mem_free_mb = psutil.virtual_memory().available / (1024 * 1024)
-                min_mem_free_mb = mem_free_mb if min_mem_free_mb is None else min(min_mem_free_mb, mem_free_mb)
-                rss = this_proc.memory_info().rss
-                # Include children
-                for child in this_proc.children(recursive=True):
-                    with contextlib.suppress(psutil.Error):
-                        rss += child.memory_info().rss
-                cur_mb = rss / (1024 * 1024)
-                peak_mem_mb = cur_mb if peak_mem_mb is None or cur_mb > peak_mem_mb else peak_mem_mb
-                time.sleep(0.01)
-        except psutil.Error:
-            pass
-
-    t = threading.Thread(target=sampler, daemon=True)
-    if psutil is not None:
-        t.start()
+    mem_stats: dict[str, float | None] = {"peak_mem_mb": None, "min_mem_free_mb": None}
 
-    pre_mem_free_mb = psutil.virtual_memory().available / (1024 * 1024)
+    pre_mem_free_mb = psutil.virtual_memory().available / (1024 * 1024) if psutil is not None else None
     try:
-        proc = subprocess.run([sys.executable, str(path)], check=False, capture_output=True, text=True)  # noqa: S603
+        proc = subprocess.Popen(  # noqa: S603
+            [sys.executable, str(path)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            bufsize=1,
+        )
     except FileNotFoundError as e:
         duration = time.perf_counter() - start
-        peak_mem_less_avail_mb = pre_mem_free_mb - min_mem_free_mb if min_mem_free_mb is not None else None
-        return 127, duration, f"File not found: {e}", peak_mem_mb, peak_mem_less_avail_mb
-    else:
-        duration = time.perf_counter() - start
-        peak_mem_less_avail_mb = pre_mem_free_mb - min_mem_free_mb if min_mem_free_mb is not None else None
-        output = (proc.stdout or "") + ("\n" + proc.stderr if proc.stderr else "")
-        return proc.returncode, duration, output, peak_mem_mb, peak_mem_less_avail_mb
+        return 127, duration, f"File not found: {e}", None, None
+
+    # Only keep the last lines of the output instead of buffering all of it
+    tail: collections.deque[str] = collections.deque(maxlen=LOG_TAIL_LINES)
+
+    def reader() -> None:
+        if proc.stdout is not None:
+            for line in proc.stdout:
+                tail.append(line)
+
+    reader_thread = threading.Thread(target=reader, daemon=True)
+    reader_thread.start()
+    # If psutil available, sample RSS of the benchmark process and its children
+    stop = threading.Event()
+    t = threading.Thread(target=sample_memory, args=(proc.pid, stop, mem_stats), daemon=True)
+    if psutil is not None:
+        t.start()
+    try:
+        proc.wait()
+        reader_thread.join()
     finally:
-        stop_flag = True
+        # Don't leave the benchmark running if the runner is interrupted
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        stop.set()
         if psutil is not None and t.is_alive():
             t.join(timeout=0.5)
 
+    duration = time.perf_counter() - start
+    min_mem_free_mb = mem_stats["min_mem_free_mb"]
+    peak_mem_less_avail_mb = (
+        pre_mem_free_mb - min_mem_free_mb if pre_mem_free_mb is not None and min_mem_free_mb is not None else None
+    )
+    output = "".join(tail)
+    return proc.returncode, duration, output, mem_stats["peak_mem_mb"], peak_mem_less_avail_mb
+
+
+def run_scripts(scripts: list[tuple[str, Path]], *, parallel: bool) -> dict[str, RunResult]:
+    """Run the scripts one at a time, or in a heavy and a light lane if parallel, and return their results by name."""
 
-def main() -> int:
+    def run_lane(lane: list[tuple[str, Path]]) -> dict[str, RunResult]:
+        return {name: run_script(path) for name, path in lane}
+
+    if not parallel:
+        return run_lane(scripts)
+
+    heavy = [(name, path) for name, path in scripts if name in HEAVY_SCRIPTS]
+    light = [(name, path) for name, path in scripts if name not in HEAVY_SCRIPTS]
+    run_outputs: dict[str, RunResult] = {}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(run_lane, lane) for lane in (heavy, light)]
+        for future in futures:
+            run_outputs.update(future.result())
+    return run_outputs
+
+
+def main(argv: list[str] | None = None) -> int:
     """Run all benchmark scripts and collect results."""
+    parser = argparse.ArgumentParser(description="Run the geospeed benchmark scripts.")
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="run the light benchmark scripts concurrently with the heavy ones",
+    )
+    args = parser.parse_args(argv)
+
     results: dict[str, dict[str, object]] = {
         "meta": {
             "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
             "python": sys.version.split()[0],
             "data_dir": str(DATA_DIR),
+            "parallel": args.parallel,
         },
         "runs": {},
     }
@@ -127,19 +222,22 @@ def main() -> int:
     if not has_data(DATA_DIR):
         results["meta"]["skipped"] = True
         results["meta"]["reason"] = f"No input data found under {DATA_DIR}."
-        RESULTS_FILE.write_text(json.dumps(results, indent=2))
+        write_results(results)
         print(results["meta"]["reason"])  # CI log hint
         return 0
 
-    for name, path in SCRIPTS:
-        if not path.exists():
+    to_run = [(name, path) for name, path in SCRIPTS if path.exists()]
+    run_outputs = run_scripts(to_run, parallel=args.parallel)
+
+    for name, _ in SCRIPTS:
+        if name not in run_outputs:
             results["runs"][name] = {
                 "status": "missing",
                 "duration_sec": None,
                 "exit_code": 127,
             }
             continue
-        code, dur, out, peak_mem_mb, peak_mem_less_avail_mb = run_script(path)
+        code, dur, out, peak_mem_mb, peak_mem_less_avail_mb = run_outputs[name]
         results["runs"][name] = {
             "status": "ok" if code == 0 else "error",
             "duration_sec": round(dur, 3),
@@ -148,13 +246,14 @@ def main() -> int:
         # Add memory info if available
         if peak_mem_mb is not None:
             results["runs"][name]["peak_memory_mb"] = round(peak_mem_mb, 1)  # type: ignore[index]
-        if peak_mem_less_avail_mb is not None:
+        # Available system memory is shared by concurrent runs, so only report it when serial
+        if not args.parallel and peak_mem_less_avail_mb is not None:
             results["runs"][name]["peak_memory_less_available_mb"] = round(peak_mem_less_avail_mb, 1)  # type: ignore[index]
         # Keep a short log snippet in case of failure
         if code != 0:
-            results["runs"][name]["log_tail"] = out.splitlines()[-20:]  # type: ignore[index]
+            results["runs"][name]["log_tail"] = out.splitlines()[-LOG_TAIL_LINES:]  # type: ignore[index]
 
-    RESULTS_FILE.write_text(json.dumps(results, indent=2))
+    write_results(results)
     print(f"Wrote results to {RESULTS_FILE}")
     print(json.dumps(results, indent=2))
     # Return 0 even on errors so CI can still update README
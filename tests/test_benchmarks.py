@@ -0,0 +1,99 @@
+"""Tests for the benchmark runner script."""
+
+import importlib.util
+import json
+import threading
+import time
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+
+BENCHMARKS_SCRIPT = Path(__file__).parent.parent / "scripts" / "benchmarks.py"
+
+
+@pytest.fixture
+def benchmarks(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ModuleType:
+    """Load scripts/benchmarks.py, with an empty ./ALKIS data dir so it can be imported."""
+    (tmp_path / "ALKIS").mkdir()
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location("benchmarks", BENCHMARKS_SCRIPT)
+    assert spec is not None
+    assert spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_has_data(benchmarks: ModuleType, tmp_path: Path) -> None:
+    """Test that data is only found if a county folder contains the buildings shapefile."""
+    data_dir = tmp_path / "ALKIS"
+    assert not benchmarks.has_data(tmp_path / "missing")
+    assert not benchmarks.has_data(data_dir)
+
+    (data_dir / "GebauedeBauwerk.shp").touch()
+    (data_dir / "county_a").mkdir()
+    assert not benchmarks.has_data(data_dir)
+
+    (data_dir / "county_a" / "GebauedeBauwerk.shp").touch()
+    assert benchmarks.has_data(data_dir)
+
+
+def test_write_results(benchmarks: ModuleType, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the results are written as JSON without leaving a temp file."""
+    results_file = tmp_path / "latest.json"
+    monkeypatch.setattr(benchmarks, "RESULTS_FILE", results_file)
+    results = {"meta": {"parallel": False}, "runs": {"geopandas": {"status": "ok", "duration_sec": 1.5}}}
+
+    benchmarks.write_results(results)
+
+    assert json.loads(results_file.read_text()) == results
+    assert not results_file.with_suffix(".json.tmp").exists()
+
+
+def test_run_scripts_parallel_lanes(benchmarks: ModuleType, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that parallel mode returns every script by name and never runs two heavy scripts at once."""
+    lock = threading.Lock()
+    running: set[str] = set()
+    overlaps: list[set[str]] = []
+
+    def fake_run_script(path: Path) -> tuple[int, float, str, None, None]:
+        name = path.stem
+        with lock:
+            running.add(name)
+            if len(running & benchmarks.HEAVY_SCRIPTS) > 1:
+                overlaps.append(set(running))
+        time.sleep(0.01)
+        with lock:
+            running.discard(name)
+        return 0, 0.01, name, None, None
+
+    monkeypatch.setattr(benchmarks, "run_script", fake_run_script)
+    scripts = [(name, Path(f"{name}.py")) for name, _ in benchmarks.SCRIPTS]
+
+    run_outputs = benchmarks.run_scripts(scripts, parallel=True)
+
+    assert set(run_outputs) == {name for name, _ in scripts}
+    assert all(output == name for name, (_, _, output, _, _) in run_outputs.items())
+    assert overlaps == []
+
+
+def test_run_script_invalid_utf8(benchmarks: ModuleType, tmp_path: Path) -> None:
+    """Test that a script writing invalid UTF-8 doesn't hang the runner and only the output tail is kept."""
+    script = tmp_path / "failing.py"
+    script.write_text(
+        "import sys\n"
+        "for i in range(30):\n"
+        "    print(f'line {i}')\n"
+        "sys.stdout.flush()\n"
+        "sys.stdout.buffer.write(b'bad \\xff\\xfe bytes\\n')\n"
+        "sys.exit(3)\n"
+    )
+
+    code, _, output, _, _ = benchmarks.run_script(script)
+
+    assert code == 3  # noqa: PLR2004
+    lines = output.splitlines()
+    assert len(lines) == benchmarks.LOG_TAIL_LINES
+    assert lines[0] == f"line {31 - benchmarks.LOG_TAIL_LINES}"
+    assert "\ufffd" in lines[-1]
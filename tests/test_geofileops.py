@@ -1,9 +1,12 @@
 """Simplified tests for geofileops benchmark functionality."""
 
+import contextlib
 import shutil
+import sqlite3
 import subprocess
 import sys
 from pathlib import Path
+from types import ModuleType
 
 import pytest
 
@@ -110,3 +113,151 @@ def test_benchmark_runner_includes_geofileops() -> None:
 
         results = json.loads(results_file.read_text())
         assert "geofileops" in results["runs"]
+
+
+@pytest.fixture
+def gfo_speed() -> ModuleType:
+    """Import geospeed.geofileops, skipping if geofileops is not installed."""
+    pytest.importorskip("geofileops")
+    from geospeed import geofileops as gfo_speed
+
+    return gfo_speed
+
+
+@pytest.fixture
+def gpkg_writes(gfo_speed: ModuleType, monkeypatch: pytest.MonkeyPatch) -> list[Path]:
+    """Replace the GeoPackage writing by a stub and return the list of GeoPackages it wrote."""
+    writes: list[Path] = []
+
+    def fake_write_gpkg(_paths: list[Path], gpkg_path: Path, *_: object) -> None:
+        writes.append(gpkg_path)
+        gpkg_path.write_bytes(b"gpkg")
+
+    monkeypatch.setattr(gfo_speed, "write_gpkg", fake_write_gpkg)
+    monkeypatch.setattr(gfo_speed, "_has_blob_envelopes", lambda *_: True)
+    return writes
+
+
+def test_build_gpkg_skips_unchanged_input(gfo_speed: ModuleType, gpkg_writes: list[Path], tmp_path: Path) -> None:
+    """Test that the GeoPackage is only built again if the inputs changed."""
+    shp = tmp_path / "a.shp"
+    shp.write_bytes(b"shapes")
+    gpkg = tmp_path / "out.gpkg"
+
+    gfo_speed.build_gpkg([shp], gpkg, "layer", ["id"])
+    assert gpkg_writes == [gpkg]
+    assert gpkg.with_suffix(".manifest.json").exists()
+
+    gfo_speed.build_gpkg([shp], gpkg, "layer", ["id"])
+    assert len(gpkg_writes) == 1
+
+
+def test_build_gpkg_same_input_via_relative_path(
+    gfo_speed: ModuleType, gpkg_writes: list[Path], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a relative path to the same input doesn't trigger a rebuild."""
+    shp = tmp_path / "a.shp"
+    shp.write_bytes(b"shapes")
+    gpkg = tmp_path / "out.gpkg"
+
+    gfo_speed.build_gpkg([shp], gpkg, "layer", ["id"])
+    monkeypatch.chdir(tmp_path)
+    gfo_speed.build_gpkg([Path("a.shp")], gpkg, "layer", ["id"])
+    assert len(gpkg_writes) == 1
+
+
+@pytest.mark.parametrize("change", ["content", "attributes", "columns", "gpkg_deleted"])
+def test_build_gpkg_rebuilds_on_change(
+    gfo_speed: ModuleType, gpkg_writes: list[Path], tmp_path: Path, change: str
+) -> None:
+    """Test that the GeoPackage is rebuilt if the inputs, columns or the GeoPackage itself changed."""
+    shp = tmp_path / "a.shp"
+    shp.write_bytes(b"shapes")
+    dbf = tmp_path / "a.dbf"
+    dbf.write_bytes(b"attributes")
+    gpkg = tmp_path / "out.gpkg"
+    cols = ["id"]
+    gfo_speed.build_gpkg([shp], gpkg, "layer", cols)
+
+    if change == "content":
+        shp.write_bytes(b"other shapes")
+    elif change == "attributes":
+        dbf.write_bytes(b"other attributes")
+    elif change == "columns":
+        cols = ["id", "name"]
+    else:
+        gpkg.unlink()
+
+    gfo_speed.build_gpkg([shp], gpkg, "layer", cols)
+    assert gpkg_writes == [gpkg, gpkg]
+
+
+def _write_geometry_table(gpkg_path: Path, flags: int | None) -> None:
+    """Write a table with one GeoPackage geometry blob header with the given flags byte."""
+    with contextlib.closing(sqlite3.connect(gpkg_path)) as conn:
+        conn.execute('CREATE TABLE "layer" ("geom" BLOB)')
+        if flags is not None:
+            conn.execute('INSERT INTO "layer" VALUES (?)', (b"GP\x00" + bytes([flags]) + b"\x00" * 4,))
+        conn.commit()
+
+
+@pytest.mark.parametrize(("flags", "expected"), [(0b00000011, True), (0b00000001, False), (None, True)])
+def test_has_blob_envelopes(tmp_path: Path, flags: int | None, *, expected: bool) -> None:
+    """Test the envelope detection in the geometry blob header, an empty layer counts as ok."""
+    pytest.importorskip("geofileops")
+    from geospeed.geofileops import _has_blob_envelopes
+
+    gpkg = tmp_path / "test.gpkg"
+    _write_geometry_table(gpkg, flags)
+    assert _has_blob_envelopes(gpkg, "layer") is expected
+
+
+def _write_county_shapefiles(data_dir: Path) -> list[Path]:
+    """Write a tiny buildings shapefile in two county folders, with 2 and 1 polygons."""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    paths = []
+    for county, n_features in [("county_a", 2), ("county_b", 1)]:
+        (data_dir / county).mkdir(parents=True)
+        gdf = gpd.GeoDataFrame(
+            {
+                "oid": [f"{county}_{i}" for i in range(n_features)],
+                "gebnutzbez": ["Wohnhaus"] * n_features,
+                "unused": list(range(n_features)),
+            },
+            geometry=[box(i, i, i + 1, i + 1) for i in range(n_features)],
+            crs="EPSG:25833",
+        )
+        path = data_dir / county / "GebauedeBauwerk.shp"
+        gdf.to_file(path)
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("writer", ["ogr2ogr", "pyogrio"])
+def test_build_gpkg(gfo_speed: ModuleType, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, writer: str) -> None:
+    """Test that build_gpkg merges the shapefiles of all counties into one indexed GeoPackage layer."""
+    pyogrio = pytest.importorskip("pyogrio")
+    from geospeed.geofileops import _has_blob_envelopes
+
+    if writer == "ogr2ogr" and shutil.which("ogr2ogr") is None:
+        pytest.skip("ogr2ogr not installed")
+    if writer == "pyogrio":
+        monkeypatch.setattr(gfo_speed.shutil, "which", lambda _: None)
+    paths = _write_county_shapefiles(tmp_path / "ALKIS")
+    gpkg = tmp_path / "buildings.gpkg"
+
+    gfo_speed.build_gpkg(paths, gpkg, "buildings", ["oid", "gebnutzbez"])
+
+    info = pyogrio.read_info(gpkg, layer="buildings")
+    assert info["features"] == 3  # noqa: PLR2004
+    assert list(info["fields"]) == ["oid", "gebnutzbez"]
+    assert info["geometry_name"] == gfo_speed.GEOMETRY_NAME
+    with contextlib.closing(sqlite3.connect(gpkg)) as conn:
+        rtree = conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = ?", (f"rtree_buildings_{gfo_speed.GEOMETRY_NAME}",)
+        ).fetchone()
+    assert rtree is not None
+    assert _has_blob_envelopes(gpkg, "buildings")
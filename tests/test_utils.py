@@ -0,0 +1,48 @@
+"""Tests for the shared benchmark utilities."""
+
+from pathlib import Path
+
+import pytest
+
+from geospeed.utils import find_shapefiles, get_file_paths
+
+
+def _make_county(data_dir: Path, name: str, files: list[str]) -> Path:
+    """Create a county folder with empty files."""
+    county_dir = data_dir / name
+    county_dir.mkdir(parents=True)
+    for file_name in files:
+        (county_dir / file_name).touch()
+    return county_dir
+
+
+def test_find_shapefiles(tmp_path: Path) -> None:
+    """Test that the building and parcel shapefiles are found in the county folders only."""
+    county_a = _make_county(tmp_path, "county_a", ["GebauedeBauwerk.shp", "NutzungFlurstueck.shp", "other.shp"])
+    county_b = _make_county(tmp_path, "county_b", ["GebauedeBauwerk.shp", "GebauedeBauwerk.dbf"])
+    (tmp_path / "NutzungFlurstueck.shp").touch()
+
+    buildings_paths, parcels_paths = find_shapefiles(tmp_path)
+
+    assert sorted(buildings_paths) == [county_a / "GebauedeBauwerk.shp", county_b / "GebauedeBauwerk.shp"]
+    assert parcels_paths == [county_a / "NutzungFlurstueck.shp"]
+
+
+def test_get_file_paths(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that get_file_paths finds the shapefiles in ./ALKIS."""
+    _make_county(tmp_path / "ALKIS", "county_a", ["GebauedeBauwerk.shp", "NutzungFlurstueck.shp"])
+    monkeypatch.chdir(tmp_path)
+
+    buildings_paths, parcels_paths = get_file_paths()
+
+    assert buildings_paths == [Path("ALKIS/county_a/GebauedeBauwerk.shp")]
+    assert parcels_paths == [Path("ALKIS/county_a/NutzungFlurstueck.shp")]
+
+
+def test_get_file_paths_no_shapefiles(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that get_file_paths raises if a layer has no shapefiles."""
+    _make_county(tmp_path / "ALKIS", "county_a", ["GebauedeBauwerk.shp"])
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(FileNotFoundError, match="No shapefiles found"):
+        get_file_paths()